@@ -1,112 +1,490 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from functools import lru_cache
+
 import yfinance as yf
 import numpy as np
 import pandas as pd
-from scipy.signal import find_peaks
 
-def get_stock_data(stock_name, timeframe):
-    """Fetch stock data with timeframe-specific periods"""
-    period_map = {
-        '5m': '7d',
-        '15m': '15d',
-        '1h': '30d',
-        '4h': '60d',
-        '1d': '3mo',
-        '1wk': '1y',
-        '1mo': '2y'
-    }
+from utils import njit
 
-    try:
-        data = yf.download(
-            stock_name,
-            period=period_map[timeframe],
-            interval=timeframe,
+# 'numba' (compiled kernel, plain Python without numba) or 'polars'
+ANALYSIS_BACKEND = os.environ.get('ANALYSIS_BACKEND', 'numba')
+
+if ANALYSIS_BACKEND == 'polars':
+    import polars as pl
+elif ANALYSIS_BACKEND != 'numba':
+    raise ValueError(f"Unknown ANALYSIS_BACKEND: {ANALYSIS_BACKEND!r}")
+
+PERIOD_MAP = {
+    '5m': '7d',
+    '15m': '15d',
+    '1h': '30d',
+    '4h': '60d',
+    '1d': '3mo',
+    '1wk': '1y',
+    '1mo': '2y'
+}
+
+# Timeframes cut from one shared daily download, with their resample
+# arguments; bars are labelled by the day they open on, as Yahoo does
+DAILY_DERIVED = {
+    '1d': None,
+    '1wk': {'rule': 'W-MON', 'label': 'left', 'closed': 'left'},
+    '1mo': {'rule': 'MS'}
+}
+# Covers the longest period among DAILY_DERIVED
+BASE_PERIOD = '2y'
+
+OHLCV_AGG = {
+    'Open': 'first',
+    'High': 'max',
+    'Low': 'min',
+    'Close': 'last',
+    'Volume': 'sum'
+}
+
+# Seconds a downloaded frame stays fresh in-process, matched to the bar size
+CACHE_TTL = {
+    '5m': 60,
+    '15m': 120,
+    '1h': 300,
+    '4h': 900,
+    '1d': 3600,
+    '1wk': 3600,
+    '1mo': 3600
+}
+
+# Columns the analysis reads; Open isn't used by any check
+ANALYSIS_COLUMNS = ('High', 'Low', 'Close', 'Volume')
+
+# Symbols per multi-ticker request, keeps the query URL under Yahoo's limit
+BATCH_SIZE = 20
+
+# Concurrent requests allowed against Yahoo, to stay clear of rate limits
+_yahoo_slots = threading.BoundedSemaphore(4)
+
+@lru_cache(maxsize=32)
+def _resolve_start(period, today_str):
+    """Turn a period like '15d' or '3mo' into a start date.
+
+    `today_str` is part of the cache key so entries roll over daily. No
+    end date is resolved: yfinance defaults it to now, whereas a bare
+    date would be read as midnight in the exchange's timezone and could
+    cut off the live session.
+    """
+    count, unit = re.fullmatch(r'(\d+)(d|mo|y)', period).groups()
+    offset = {
+        'd': pd.DateOffset(days=int(count)),
+        'mo': pd.DateOffset(months=int(count)),
+        'y': pd.DateOffset(years=int(count))
+    }[unit]
+    today = pd.Timestamp(today_str)
+    return (today - offset).strftime('%Y-%m-%d')
+
+@lru_cache(maxsize=256)
+def _fetch(tickers, start, interval, bucket):
+    """Download raw OHLCV; `bucket` rolls over every TTL to expire the entry.
+
+    `tickers` is one symbol or several joined by spaces. The returned
+    frame is shared between callers and must not be mutated.
+    """
+    with _yahoo_slots:
+        return yf.download(
+            tickers,
+            start=start,
+            interval=interval,
+            group_by='ticker',
+            threads=True,
             progress=False,
             timeout=15,
             auto_adjust=True
         )
 
-        # Filter market hours (9:15 to 15:30) for intraday timeframes
-        if timeframe in ['5m', '15m', '1h', '4h']:
-            data = data.between_time('09:15', '15:30')
+def _prepare(data, stock_name, timeframe):
+    """Slice one symbol out of a download and clean it up"""
+    if isinstance(data.columns, pd.MultiIndex):
+        if stock_name not in data.columns.get_level_values(0):
+            return None
+        data = data[stock_name]
 
-        return data.dropna() if not data.empty else None
+    # Filter market hours (9:15 to 15:30) for intraday timeframes
+    if timeframe in ['5m', '15m', '1h', '4h']:
+        data = data.between_time('09:15', '15:30')
+
+    return data if not data.empty else None
+
+def _download_args(timeframe):
+    """(start, interval, bucket) of the download backing a timeframe"""
+    if timeframe in DAILY_DERIVED:
+        period, interval = BASE_PERIOD, '1d'
+    else:
+        period, interval = PERIOD_MAP[timeframe], timeframe
+    start = _resolve_start(period, date.today().isoformat())
+    return start, interval, int(time.time() // CACHE_TTL[interval])
+
+def _derive(data, timeframe):
+    """Trim the daily base to a timeframe's period and roll it up"""
+    if data is None or timeframe not in DAILY_DERIVED:
+        return data
+
+    start = _resolve_start(PERIOD_MAP[timeframe], date.today().isoformat())
+    data = data.loc[start:]
+    resample = DAILY_DERIVED[timeframe]
+    if resample is not None:
+        data = data.resample(**resample).agg(OHLCV_AGG)
+    return data if not data.empty else None
+
+def refresh_stock(stock_name):
+    """Drop cached downloads so the next fetch of `stock_name` hits Yahoo.
+
+    lru_cache can't evict a single key, so every cached download goes.
+    """
+    _fetch.cache_clear()
+    with _ema_lock:
+        for key in [k for k in _ema_cache if k[0] == stock_name]:
+            del _ema_cache[key]
+
+def get_stock_data(stock_name, timeframe):
+    """Fetch stock data with timeframe-specific periods"""
+    try:
+        data = _fetch(stock_name, *_download_args(timeframe))
+        return _derive(_prepare(data, stock_name, timeframe), timeframe)
 
     except Exception as e:
         print(f"Error fetching {stock_name}: {str(e)}")
         return None
 
+def get_stock_data_batch(symbols, timeframe):
+    """Fetch several symbols with one request per chunk of BATCH_SIZE"""
+    args = _download_args(timeframe)
+    frames = {}
+    for i in range(0, len(symbols), BATCH_SIZE):
+        chunk = symbols[i:i + BATCH_SIZE]
+        try:
+            data = _fetch(" ".join(chunk), *args)
+        except Exception as e:
+            print(f"Error fetching {', '.join(chunk)}: {str(e)}")
+            data = None
+
+        for stock_name in chunk:
+            frames[stock_name] = (
+                _derive(_prepare(data, stock_name, timeframe), timeframe)
+                if data is not None else None
+            )
+    return frames
+
+# (symbol, timeframe, window) -> (first bar timestamp, seed bar timestamp,
+# seed bar close, EMA through the seed bar); the seed is the last completed bar
+_ema_cache = OrderedDict()
+_ema_lock = threading.Lock()
+EMA_CACHE_SIZE = 512
+
+@njit(cache=True)
+def _ewma(x, alpha):
+    """Single-pass EMA, same as pandas ewm(adjust=False)"""
+    out = np.empty_like(x)
+    ema = x[0]
+    for i in range(x.size):
+        ema = alpha * x[i] + (1 - alpha) * ema
+        out[i] = ema
+    return out
+
 def calculate_ema(data, window=50):
     """Compute EMA"""
-    return data['Close'].ewm(span=window, adjust=False).mean()
+    close = data['Close']
+    values = close.to_numpy(dtype=np.float64)
+    mask = ~np.isnan(values)
+    return pd.Series(_ewma(values[mask], 2 / (window + 1)), index=close.index[mask], name=close.name)
+
+def _ema_seed(index, close, key):
+    """Position to resume the cached EMA of `key` from, and its seed.
+
+    The seed is only trusted while the window starts at the same bar and
+    the seed bar's close is unchanged; a moved window or re-adjusted
+    history (splits, dividends) falls back to a full pass.
+    """
+    with _ema_lock:
+        cached = _ema_cache.get(key)
+    if cached is not None:
+        first_ts, seed_ts, seed_close, seed = cached
+        pos = index.searchsorted(seed_ts)
+        if (index[0] == first_ts and pos < len(index) - 1
+                and index[pos] == seed_ts and close[pos] == seed_close):
+            return pos + 1, seed
+    return 0, np.nan
 
-def get_support_resistance_levels(data, lookback=50):
-    """Identify recent support and resistance levels"""
-    recent_data = data.iloc[-lookback:]
+def _ema_store(index, close, key, seed):
+    """Cache `seed`, the EMA through the second-to-last bar, for `key`"""
+    with _ema_lock:
+        _ema_cache[key] = (index[0], index[-2], close[-2], seed)
+        _ema_cache.move_to_end(key)
+        if len(_ema_cache) > EMA_CACHE_SIZE:
+            _ema_cache.popitem(last=False)
 
-    lows = recent_data['Low'].to_numpy().squeeze()
-    highs = recent_data['High'].to_numpy().squeeze()
+def _unpack(data):
+    """Timestamps and HLCV as flat float64 arrays, minus rows missing a price"""
+    h, l, c, v = (data[col].to_numpy(dtype=np.float64) for col in ANALYSIS_COLUMNS)
+    mask = ~(np.isnan(c) | np.isnan(h) | np.isnan(l))
+    if mask.all():
+        return data.index, h, l, c, v
+    return data.index[mask], h[mask], l[mask], c[mask], v[mask]
 
-    # Ensure 1D array for find_peaks
-    lows = np.ravel(lows)
-    highs = np.ravel(highs)
+@njit(cache=True)
+def _find_peaks(x, distance, prominence):
+    """Indices of local maxima, selected like scipy.signal.find_peaks.
 
-    support_idx, _ = find_peaks(-lows, distance=5, prominence=1)
-    resistance_idx, _ = find_peaks(highs, distance=5, prominence=1)
+    Peaks of equal height are pruned in a fixed order (stable sort, so the
+    rightmost survives), whereas SciPy's tie order follows NumPy's
+    unstable argsort; results can differ from SciPy on tied heights.
+    """
+    n = x.size
+    peaks = np.empty(n // 2 + 1, dtype=np.int64)
+    n_peaks = 0
+
+    # Local maxima, flat tops resolve to their midpoint
+    i = 1
+    while i < n - 1:
+        if x[i - 1] < x[i]:
+            ahead = i + 1
+            while ahead < n - 1 and x[ahead] == x[i]:
+                ahead += 1
+            if x[ahead] < x[i]:
+                peaks[n_peaks] = (i + ahead - 1) // 2
+                n_peaks += 1
+                i = ahead
+        i += 1
+    peaks = peaks[:n_peaks]
+
+    # Drop lower peaks within `distance` of a higher one
+    keep = np.ones(n_peaks, dtype=np.bool_)
+    order = np.argsort(x[peaks], kind='mergesort')
+    for k in range(n_peaks - 1, -1, -1):
+        j = order[k]
+        if not keep[j]:
+            continue
+        m = j - 1
+        while m >= 0 and peaks[j] - peaks[m] < distance:
+            keep[m] = False
+            m -= 1
+        m = j + 1
+        while m < n_peaks and peaks[m] - peaks[j] < distance:
+            keep[m] = False
+            m += 1
+
+    # Prominence: height above the higher of the two flanking minima
+    for j in range(n_peaks):
+        if not keep[j]:
+            continue
+        p = peaks[j]
+        left_min = x[p]
+        m = p
+        while m >= 0 and x[m] <= x[p]:
+            if x[m] < left_min:
+                left_min = x[m]
+            m -= 1
+        right_min = x[p]
+        m = p
+        while m < n and x[m] <= x[p]:
+            if x[m] < right_min:
+                right_min = x[m]
+            m += 1
+        if x[p] - max(left_min, right_min) < prominence:
+            keep[j] = False
+
+    return peaks[keep]
+
+@njit(cache=True)
+def _rolling_argmax(x, w):
+    """Index of the max of every length-`w` window, via a monotonic deque.
+
+    Ties resolve to the latest index, so a flat top counts once, at its
+    right end.
+    """
+    n = x.size
+    out = np.empty(max(n - w + 1, 0), dtype=np.int64)
+    # Candidate indices with decreasing values; each is pushed and popped once
+    dq = np.empty(n, dtype=np.int64)
+    head = tail = 0
+    for i in range(n):
+        while tail > head and x[dq[tail - 1]] <= x[i]:
+            tail -= 1
+        dq[tail] = i
+        tail += 1
+        if dq[head] <= i - w:
+            head += 1
+        if i >= w - 1:
+            out[i - w + 1] = dq[head]
+    return out
+
+@njit(cache=True)
+def _swing_points(x, order):
+    """Bars that are the max of the `order` bars on either side of them"""
+    argmax = _rolling_argmax(x, 2 * order + 1)
+    return np.nonzero(argmax == np.arange(argmax.size) + order)[0] + order
+
+# Lookbacks past this use O(n) swing points instead of the prominence scan
+LONG_LOOKBACK = 200
+
+def get_support_resistance_levels(highs, lows, lookback=50, swing_order=None):
+    """Identify recent support and resistance levels
+
+    With `swing_order` > 0, peaks are swing points found in O(n) instead
+    of by the prominence scan; left as None, that switches on past
+    LONG_LOOKBACK bars with the peak distance of 5 as the order.
+    """
+    if swing_order is None:
+        swing_order = 5 if lookback > LONG_LOOKBACK else 0
+
+    lows = lows[-lookback:]
+    highs = highs[-lookback:]
+
+    if swing_order > 0:
+        support_idx = _swing_points(np.ascontiguousarray(-lows), swing_order)
+        resistance_idx = _swing_points(np.ascontiguousarray(highs), swing_order)
+    else:
+        support_idx = _find_peaks(np.ascontiguousarray(-lows), 5, 1.0)
+        resistance_idx = _find_peaks(np.ascontiguousarray(highs), 5, 1.0)
 
     support_levels = lows[support_idx]
     resistance_levels = highs[resistance_idx]
 
     return {
-        'support': sorted(support_levels[-3:].tolist()),
-        'resistance': sorted(resistance_levels[-3:].tolist())
+        'support': np.sort(support_levels[-3:]),
+        'resistance': np.sort(resistance_levels[-3:])
     }
 
-def analyze_stock(stock_name, timeframe='1d'):
-    """Main stock analysis function"""
-    data = get_stock_data(stock_name, timeframe)
-    if data is None or len(data) < 20:
-        print(f"Insufficient data for {stock_name} ({timeframe})")
-        return None
+@njit(cache=True, error_model='numpy')
+def _analyze_core(h, l, c, v, resistance, ema_start, ema_seed, alpha):
+    """Numeric side of analyze_stock, fused into one compiled pass"""
+    n = c.size
+    last_close = c[-1]
 
-    try:
-        last_close = data['Close'].iloc[-1].item()
-        ema_50 = calculate_ema(data)
-        ema_last = ema_50.iloc[-1].item()
-
-        # Trend direction
-        uptrend = last_close > ema_last
-
-        # HH/HL pattern (3-bar)
-        highs = data['High'].to_numpy().squeeze()[-3:]
-        lows = data['Low'].to_numpy().squeeze()[-3:]
-        hh_hl = (highs[-1] > highs[-2] > highs[-3]) and (lows[-1] > lows[-2] > lows[-3])
-
-        # Support/Resistance levels
-        levels = get_support_resistance_levels(data)
-        near_resistance = any(
-            abs(last_close - level) / level < 0.02 for level in levels['resistance']
+    # Trend direction, EMA resumed from the cached seed
+    ema = c[ema_start] if np.isnan(ema_seed) else ema_seed
+    ema_prev = ema
+    for i in range(ema_start, n):
+        ema_prev = ema
+        ema = alpha * c[i] + (1 - alpha) * ema
+    uptrend = last_close > ema
+
+    # HH/HL pattern (3-bar)
+    hh_hl = h[-1] > h[-2] and h[-2] > h[-3] and l[-1] > l[-2] and l[-2] > l[-3]
+
+    # Within 2% of a resistance level
+    near_resistance = False
+    for level in resistance:
+        if abs(last_close - level) / level < 0.02:
+            near_resistance = True
+            break
+
+    # Volume spike against the previous 9 bars, skipping missing volume
+    vol_sum = 0.0
+    vol_bars = 0
+    for i in range(n - 10, n - 1):
+        if not np.isnan(v[i]):
+            vol_sum += v[i]
+            vol_bars += 1
+    volume_spike = vol_bars > 0 and v[-1] > vol_sum / vol_bars * 1.5
+
+    # ATR (Average True Range) over the last 14 bars
+    tr_sum = 0.0
+    for i in range(n - 14, n):
+        tr_sum += max(h[i] - l[i], abs(h[i] - c[i - 1]), abs(l[i] - c[i - 1]))
+    atr = tr_sum / 14
+
+    # Risk/Reward Calculation
+    stop_loss = last_close - 2 * atr
+    target = last_close + 4 * atr
+    rr_ratio = (target - last_close) / (last_close - stop_loss)
+
+    return (uptrend, hh_hl, near_resistance, volume_spike,
+            stop_loss, target, rr_ratio, ema_prev, ema)
+
+def _analyze_polars(h, l, c, v, resistance):
+    """Same outputs as _analyze_core from one lazy Polars query.
+
+    Selected with ANALYSIS_BACKEND=polars. The EMA is rebuilt over the
+    full series rather than resumed, so this path leaves _ema_cache alone.
+    """
+    # Previous close, seeded with the first close so TR has no null head
+    prev_close = np.empty_like(c)
+    prev_close[0] = c[0]
+    prev_close[1:] = c[:-1]
+
+    row = (
+        pl.LazyFrame({'High': h, 'Low': l, 'Close': c, 'PrevClose': prev_close, 'Volume': v})
+        .with_columns(
+            tr=pl.max_horizontal(
+                pl.col('High') - pl.col('Low'),
+                (pl.col('High') - pl.col('PrevClose')).abs(),
+                (pl.col('Low') - pl.col('PrevClose')).abs()
+            ),
+            ema=pl.col('Close').ewm_mean(span=50, adjust=False),
+            # Missing volume as null, so it neither counts nor spikes
+            Volume=pl.col('Volume').fill_nan(None)
+        )
+        .select(
+            last_close=pl.col('Close').last(),
+            ema_prev=pl.col('ema').tail(2).first(),
+            ema_last=pl.col('ema').last(),
+            hh_hl=(pl.col('High').diff().tail(2) > 0).all()
+                  & (pl.col('Low').diff().tail(2) > 0).all(),
+            volume_spike=(
+                pl.col('Volume').last()
+                > pl.col('Volume').slice(-10, 9).mean() * 1.5
+            ).fill_null(False),
+            atr=pl.col('tr').tail(14).mean()
         )
+        .collect()
+        .row(0, named=True)
+    )
 
-        # Volume spike detection
-        volumes = data['Volume'].to_numpy().squeeze()[-10:]
-        volume_spike = volumes[-1] > np.mean(volumes[:-1]) * 1.5
+    last_close, atr = row['last_close'], row['atr']
+    near_resistance = bool((np.abs(last_close - resistance) / resistance < 0.02).any())
 
-        # ATR (Average True Range)
-        prev_close = data['Close'].shift(1).to_numpy().squeeze()
-        high = data['High'].to_numpy().squeeze()
-        low = data['Low'].to_numpy().squeeze()
+    # Risk/Reward Calculation
+    stop_loss = last_close - 2 * atr
+    target = last_close + 4 * atr
+    rr_ratio = (target - last_close) / (last_close - stop_loss)
 
-        tr = np.maximum.reduce([
-            high - low,
-            np.abs(high - prev_close),
-            np.abs(low - prev_close)
-        ])
-        atr = pd.Series(tr).rolling(14).mean().iloc[-1]
+    return (last_close > row['ema_last'], row['hh_hl'],
+            near_resistance, row['volume_spike'],
+            stop_loss, target, rr_ratio, row['ema_prev'], row['ema_last'])
 
-        # Risk/Reward Calculation
-        stop_loss = last_close - 2 * atr
-        target = last_close + 4 * atr
-        rr_ratio = (target - last_close) / (last_close - stop_loss)
+def analyze_stock(stock_name, timeframe='1d', data=None):
+    """Main stock analysis function
+
+    Pass `data` from get_stock_data_batch to skip the per-symbol download.
+    Only scalars and level arrays are returned; charts refetch the frame.
+    """
+    if data is None:
+        data = get_stock_data(stock_name, timeframe)
+    bars = _unpack(data) if data is not None else None
+    if bars is None or len(bars[0]) < 20:
+        print(f"Insufficient data for {stock_name} ({timeframe})")
+        return None
+
+    try:
+        index, h, l, c, v = bars
+        levels = get_support_resistance_levels(h, l)
+
+        resistance = levels['resistance']
+
+        if ANALYSIS_BACKEND == 'polars':
+            checks = _analyze_polars(h, l, c, v, resistance)
+        else:
+            key = (stock_name, timeframe, 50)
+            ema_start, ema_seed = _ema_seed(index, c, key)
+            checks = _analyze_core(h, l, c, v, resistance, ema_start, ema_seed, 2 / 51)
+            _ema_store(index, c, key, checks[-2])
+        (uptrend, hh_hl, near_resistance, volume_spike,
+         stop_loss, target, rr_ratio, _, _) = checks
 
         return {
             "results": {
@@ -120,11 +498,15 @@ def analyze_stock(stock_name, timeframe='1d'):
             "levels": levels,
             "stop_loss": round(stop_loss, 2),
             "target": round(target, 2),
-            "rr_ratio": round(rr_ratio, 2),
-            "data": data,
-            "ema_50": ema_50
+            "rr_ratio": round(rr_ratio, 2)
         }
 
     except Exception as e:
         print(f"Analysis error: {str(e)}")
         return None
+
+def analyze_many(symbols, timeframe='1d', max_workers=16):
+    """Run analyze_stock over several symbols concurrently"""
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        results = executor.map(lambda s: analyze_stock(s, timeframe), symbols)
+        return dict(zip(symbols, results))
@@ -1,19 +1,26 @@
 import sys
+from datetime import date
 from pathlib import Path
+import altair as alt
+import numpy as np
+import pandas as pd
 import streamlit as st
-import matplotlib.pyplot as plt
-import matplotlib.dates as mdates
-from analysis import analyze_stock
+from analysis import analyze_stock, calculate_ema, get_stock_data, refresh_stock
 
 # Configure paths
 current_dir = Path(__file__).parent
 sys.path.insert(0, str(current_dir))
 
-# Cache the analysis
+# Cache the analysis; `day` keys entries so they roll over daily
 @st.cache_data
-def cached_analysis(stock_name, timeframe):
+def cached_analysis(stock_name, timeframe, day):
     return analyze_stock(stock_name, timeframe)
 
+# Chart frame is cached apart from the small analysis summary
+@st.cache_data
+def _get_frame(stock_name, timeframe, day):
+    return get_stock_data(stock_name, timeframe)
+
 # Page configuration
 st.set_page_config(
     page_title="Advanced Stock Analysis",
@@ -51,43 +58,70 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-def plot_chart(data, ema_50, stock_name, timeframe, levels):
-    """Enhanced chart with support/resistance levels"""
-    fig, ax = plt.subplots(figsize=(14, 7))
-    
-    # Price and EMA
-    linewidth = 1.5 if timeframe in ['5m','15m','1h','4h'] else 2
-    ax.plot(data.index, data['Close'], label='Price', linewidth=linewidth)
-    
-    # Only show EMA for daily+ timeframes
-    if timeframe not in ['5m','15m','1h','4h']:
-        ax.plot(data.index, ema_50, label='50 EMA', color='orange', linestyle='--', alpha=0.8)
-    
-    # Support levels (green)
-    for level in levels['support']:
-        ax.axhline(y=level, color='green', linestyle='--', alpha=0.6, linewidth=1.2,
-                  label=f'Support {level:.2f}')
-    
-    # Resistance levels (red)
-    for level in levels['resistance']:
-        ax.axhline(y=level, color='red', linestyle='--', alpha=0.6, linewidth=1.2,
-                  label=f'Resistance {level:.2f}')
-    
+@st.cache_resource(max_entries=32)
+def _build_chart(_data, _ema_50, _levels, stock_name, timeframe, data_key, levels_key):
+    """Altair spec for plot_chart, keyed on cheap digests of the inputs"""
+    data, ema_50, levels = _data, _ema_50, _levels
+    intraday = timeframe in ['5m','15m','1h','4h']
+
+    # Price and EMA, only show EMA for daily+ timeframes. Sent wide and
+    # folded to long form in the browser, so each timestamp ships once
+    series = {'Price': data['Close']}
+    if not intraday:
+        series['50 EMA'] = ema_50
+    chart_df = pd.DataFrame(series, index=data.index).rename_axis('Date').reset_index()
+
+    # Support (green) and resistance (red) levels
+    levels_df = pd.DataFrame({
+        'Value': np.concatenate([levels['support'], levels['resistance']]),
+        'Series': ['Support'] * len(levels['support'])
+                  + ['Resistance'] * len(levels['resistance'])
+    })
+
     # Format x-axis based on timeframe
     if timeframe in ['5m','15m']:
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M'))
-        plt.xticks(rotation=45)
+        x_axis = alt.Axis(format='%H:%M', labelAngle=-45)
     elif timeframe in ['1h','4h']:
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%m/%d %H:%M'))
-        plt.xticks(rotation=45)
+        x_axis = alt.Axis(format='%m/%d %H:%M', labelAngle=-45)
     else:
-        ax.xaxis.set_major_formatter(mdates.DateFormatter('%Y-%m-%d'))
-    
-    ax.set_title(f"{stock_name} ({timeframe}) - Support/Resistance Levels")
-    ax.legend(loc='upper left', bbox_to_anchor=(1, 1))
-    ax.grid(True, linestyle=':', alpha=0.5)
-    plt.tight_layout()
-    st.pyplot(fig)
+        x_axis = alt.Axis(format='%Y-%m-%d')
+
+    color = alt.Color('Series:N', scale=alt.Scale(
+        domain=['Price', '50 EMA', 'Support', 'Resistance'],
+        range=['#1f77b4', 'orange', 'green', 'red']
+    ))
+    dash = alt.StrokeDash('Series:N', legend=None, scale=alt.Scale(
+        domain=['Price', '50 EMA', 'Support', 'Resistance'],
+        range=[[1, 0], [6, 3], [4, 4], [4, 4]]
+    ))
+
+    lines = alt.Chart(chart_df).transform_fold(
+        list(series), as_=['Series', 'Value']
+    ).mark_line().encode(
+        x=alt.X('Date:T', axis=x_axis, title=None),
+        y=alt.Y('Value:Q', scale=alt.Scale(zero=False), title='Price'),
+        color=color,
+        strokeDash=dash,
+        tooltip=['Date:T', 'Series:N', alt.Tooltip('Value:Q', format='.2f')]
+    )
+    rules = alt.Chart(levels_df).mark_rule(opacity=0.6).encode(
+        y='Value:Q',
+        color=color,
+        strokeDash=dash,
+        tooltip=['Series:N', alt.Tooltip('Value:Q', format='.2f')]
+    )
+
+    return (lines + rules).properties(
+        title=f"{stock_name} ({timeframe}) - Support/Resistance Levels",
+        height=420
+    ).interactive()
+
+def plot_chart(data, ema_50, stock_name, timeframe, levels):
+    """Enhanced chart with support/resistance levels"""
+    data_key = (len(data), data.index[-1], hash(tuple(data['Close'].values[-20:])))
+    levels_key = (tuple(levels['support']), tuple(levels['resistance']))
+    chart = _build_chart(data, ema_50, levels, stock_name, timeframe, data_key, levels_key)
+    st.altair_chart(chart, use_container_width=True)
 
 def main():
     st.title("📈 Multi-Timeframe Stock Analyzer")
@@ -102,10 +136,16 @@ def main():
                 options=['5m', '15m', '1h', '4h', '1d', '1wk', '1mo'],
                 index=4
             )
+        refresh = st.checkbox("Refresh data", value=False)
         
         if st.form_submit_button("Analyze Now", type="primary"):
+            today = date.today().isoformat()
+            if refresh:
+                refresh_stock(stock)
+                cached_analysis.clear()
+                _get_frame.clear()
             with st.spinner(f"Analyzing {stock} ({timeframe})..."):
-                result = cached_analysis(stock, timeframe)
+                result = cached_analysis(stock, timeframe, today)
                 
             if not result:
                 st.error("""
@@ -161,13 +201,15 @@ def main():
                 
                 # Chart
                 st.markdown("#### Price Analysis")
-                plot_chart(
-                    result["data"], 
-                    result["ema_50"], 
-                    stock, 
-                    timeframe, 
-                    result["levels"]
-                )
+                data = _get_frame(stock, timeframe, today)
+                if data is not None:
+                    plot_chart(
+                        data, 
+                        calculate_ema(data), 
+                        stock, 
+                        timeframe, 
+                        result["levels"]
+                    )
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+import analysis
+
+pl = pytest.importorskip('polars')
+
+
+@pytest.fixture(autouse=True)
+def polars_backend(monkeypatch):
+    # _analyze_polars reads the module-level `pl`, only bound for that backend
+    monkeypatch.setattr(analysis, 'pl', pl, raising=False)
+
+
+def _bars(rng, n):
+    c = 100 + np.cumsum(rng.normal(size=n))
+    h = c + rng.random(n)
+    l = c - rng.random(n)
+    v = rng.integers(1, 1000, n).astype(np.float64)
+    return h, l, c, v
+
+
+def _assert_same(h, l, c, v, resistance):
+    core = analysis._analyze_core(h, l, c, v, resistance, 0, np.nan, 2 / 51)
+    polars = analysis._analyze_polars(h, l, c, v, resistance)
+    for a, b in zip(core, polars):
+        assert np.isclose(a, b)
+
+
+@pytest.mark.parametrize('missing', [[-1], [-5], [-10, -9], list(range(-10, -1)), list(range(-10, 0))])
+def test_nan_volume(missing):
+    rng = np.random.default_rng(len(missing))
+    h, l, c, v = _bars(rng, 60)
+    v[-1] = 5000.0
+    v[missing] = np.nan
+    _assert_same(h, l, c, v, np.array([c[-1] * 1.01]))
+
+
+@pytest.mark.parametrize('seed', range(50))
+def test_random_series(seed):
+    rng = np.random.default_rng(seed)
+    h, l, c, v = _bars(rng, int(rng.integers(20, 300)))
+    if seed % 3 == 0:
+        # Force the HH/HL and volume-spike checks true
+        h[-3:] = h[-4] + np.arange(1, 4)
+        l[-3:] = l[-4] + np.arange(1, 4)
+        v[-1] = 1e6
+    if seed % 4 == 0:
+        v[rng.integers(0, v.size, 5)] = np.nan
+    _assert_same(h, l, c, v, np.array([c[-1] * 1.01, c[-1] * 0.9]))
+
+
+def test_no_levels():
+    h, l, c, v = _bars(np.random.default_rng(0), 40)
+    _assert_same(h, l, c, v, np.empty(0))
+
+
+def test_analyze_stock_same_results(monkeypatch):
+    import pandas as pd
+
+    rng = np.random.default_rng(3)
+    h, l, c, v = _bars(rng, 120)
+    data = pd.DataFrame(
+        {'Open': c, 'High': h, 'Low': l, 'Close': c, 'Volume': v},
+        index=pd.date_range('2024-01-01', periods=120)
+    )
+    core = analysis.analyze_stock('X', '1d', data=data)
+    monkeypatch.setattr(analysis, 'ANALYSIS_BACKEND', 'polars')
+    polars = analysis.analyze_stock('X', '1d', data=data)
+    for key in ('results', 'stop_loss', 'target', 'rr_ratio'):
+        assert core[key] == polars[key]
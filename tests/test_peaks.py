@@ -0,0 +1,66 @@
+import numpy as np
+import pytest
+
+import analysis
+
+signal = pytest.importorskip('scipy.signal')
+
+
+def _rightmost_wins(x, distance, prominence):
+    """SciPy's selection with the documented stable tie-break for distance"""
+    peaks, _ = signal.find_peaks(x)
+    keep = np.ones(peaks.size, dtype=bool)
+    for j in np.argsort(x[peaks], kind='mergesort')[::-1]:
+        if not keep[j]:
+            continue
+        near = np.abs(peaks - peaks[j]) < distance
+        near[j] = False
+        keep[near] = False
+    peaks = peaks[keep]
+    return peaks[signal.peak_prominences(x, peaks)[0] >= prominence]
+
+
+def _walks(seed, count, decimals=None):
+    rng = np.random.default_rng(seed)
+    for _ in range(count):
+        x = 100 + np.cumsum(rng.normal(size=int(rng.integers(3, 80))))
+        if decimals is not None:
+            x = np.round(x, decimals)
+        else:
+            # Flat runs without tying distinct peaks
+            repeat = rng.random(x.size) < 0.2
+            for i in range(1, x.size):
+                if repeat[i]:
+                    x[i] = x[i - 1]
+        yield x
+
+
+def _has_tied_peaks(x):
+    peaks, _ = signal.find_peaks(x)
+    return np.unique(x[peaks]).size < peaks.size
+
+
+def test_matches_scipy_without_ties():
+    checked = 0
+    for x in _walks(0, 3000):
+        if _has_tied_peaks(x):
+            continue
+        expected, _ = signal.find_peaks(x, distance=5, prominence=1)
+        np.testing.assert_array_equal(analysis._find_peaks(x, 5, 1.0), expected)
+        checked += 1
+    assert checked > 2000
+
+
+def test_ties_keep_rightmost():
+    tied = 0
+    for x in _walks(1, 3000, decimals=1):
+        tied += _has_tied_peaks(x)
+        np.testing.assert_array_equal(
+            analysis._find_peaks(x, 5, 1.0), _rightmost_wins(x, 5, 1.0)
+        )
+    assert tied > 100
+
+
+def test_equal_peaks_within_distance():
+    x = np.array([0.0, 5.0, 0.0, 5.0, 0.0])
+    np.testing.assert_array_equal(analysis._find_peaks(x, 5, 1.0), [3])
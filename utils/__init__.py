@@ -0,0 +1 @@
+from ._njit import HAVE_NUMBA, njit